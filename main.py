@@ -1,90 +1,194 @@
 import argparse
 import logging
 import os
+import queue
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
-from modules.synapse_parser import SynapseParser
-from modules.vocal_synthesizer import VocalSynthesizer
-from modules.dsp_engine import DSPEngine
-from modules.video_assembler import VideoAssembler
-from modules.seo_metadata_injector import SEOMetadataInjector
-
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("logs/production.log"),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("ScriptureSoakingFactory")
 
+# Note: In a real run, we need a background video file. 
+# For this script, we assume it exists or use a placeholder.
+BACKGROUND_VIDEO = "assets/visual_loops/default_bg.mp4"
+
+def configure_logging():
+    """Configures console and file logging; deferred so importing main stays side-effect free."""
+    os.makedirs("logs", exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("logs/production.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+def create_stage_components(output_dir: str) -> Dict[str, Any]:
+    """Builds the long-lived stage objects, shared by every spec in a run."""
+    # Stage modules pull in scipy/pydub/ffmpeg/pydantic; import them only when running
+    from modules.vocal_synthesizer import VocalSynthesizer
+    from modules.dsp_engine import DSPEngine
+    from modules.video_assembler import VideoAssembler
+    from modules.seo_metadata_injector import SEOMetadataInjector
+
+    return {
+        "synthesizer": VocalSynthesizer(),
+        "dsp": DSPEngine(),
+        "assembler": VideoAssembler(output_dir=os.path.join(output_dir, "rendered_videos")),
+        "seo": SEOMetadataInjector()
+    }
+
+def synthesis_stage(job: Dict[str, Any], components: Dict[str, Any]):
+    """Stages 1-2: parse the spec and synthesize its vocals (network-bound)."""
+    from modules.synapse_parser import SynapseParser
+
+    # Stage 1: Parse Spiritual Spec
+    logger.info(f"--- Stage 1: Parsing Spiritual Spec ({job['spec_path']}) ---")
+    parser = SynapseParser(job['spec_path'])
+    job['tasks'] = parser.create_task_manifest()
+    
+    # Stage 2: Vocal Synthesis
+    logger.info(f"--- Stage 2: Vocal Synthesis ({job['spec_path']}) ---")
+    job['vocal_paths'] = components['synthesizer'].synthesize_batch(job['tasks']['vocal_tasks'])
+
+def dsp_stage(job: Dict[str, Any], components: Dict[str, Any]):
+    """Stage 3: run the DSP chain and write the processed audio (CPU-bound)."""
+    logger.info(f"--- Stage 3: DSP Processing ({job['spec_path']}) ---")
+    processed_audio = components['dsp'].process_chain(job['vocal_paths'])
+    processed_audio.export(job['audio_path'], format="wav")
+
+def video_stage(job: Dict[str, Any], components: Dict[str, Any]):
+    """Stages 4-5: render the video (encoder-bound) and generate its SEO metadata."""
+    # Stage 4: Video Assembly
+    logger.info(f"--- Stage 4: Video Assembly ({job['spec_path']}) ---")
+    if not Path(BACKGROUND_VIDEO).exists():
+        logger.warning(f"Background video {BACKGROUND_VIDEO} not found. Rendering will fail.")
+        # In a real scenario, we might download a default or use a static image
+        
+    job['video_path'] = components['assembler'].render_final_video(
+        audio_path=job['audio_path'],
+        background_path=BACKGROUND_VIDEO,
+        duration_hours=job['duration'],
+        output_filename=job['video_filename']
+    )
+    
+    # Stage 5: SEO Metadata Generation
+    logger.info(f"--- Stage 5: SEO Metadata Generation ({job['spec_path']}) ---")
+    job['metadata'] = components['seo'].generate_all(job['tasks'], job['duration'], output_dir=job['metadata_dir'])
+
 def run_pipeline(input_spec: str, duration: int, output_dir: str):
     """
     Orchestrates the full content production pipeline.
     """
+    configure_logging()
     logger.info("🚀 Starting Scripture Soaking Factory Pipeline")
     
     try:
-        # Stage 1: Parse Spiritual Spec
-        logger.info("--- Stage 1: Parsing Spiritual Spec ---")
-        parser = SynapseParser(input_spec)
-        tasks = parser.create_task_manifest()
-        
-        # Stage 2: Vocal Synthesis
-        logger.info("--- Stage 2: Vocal Synthesis ---")
-        synthesizer = VocalSynthesizer()
-        vocal_paths = []
-        for task in tasks['vocal_tasks']:
-            path = synthesizer.synthesize_verse(task['text'], task['emotion'])
-            vocal_paths.append(path)
-            
-        # Stage 3: DSP Processing
-        logger.info("--- Stage 3: DSP Processing ---")
-        dsp = DSPEngine()
-        processed_audio = dsp.process_chain(vocal_paths)
-        audio_output_path = "output/temp_processed_audio.wav"
-        processed_audio.export(audio_output_path, format="wav")
-        
-        # Stage 4: Video Assembly
-        logger.info("--- Stage 4: Video Assembly ---")
-        assembler = VideoAssembler(output_dir=os.path.join(output_dir, "rendered_videos"))
-        # Note: In a real run, we need a background video file. 
-        # For this script, we assume it exists or use a placeholder.
-        bg_video = "assets/visual_loops/default_bg.mp4"
-        if not Path(bg_video).exists():
-            logger.warning(f"Background video {bg_video} not found. Rendering will fail.")
-            # In a real scenario, we might download a default or use a static image
-            
-        video_path = assembler.render_final_video(
-            audio_path=audio_output_path,
-            background_path=bg_video,
-            duration_hours=duration
-        )
+        components = create_stage_components(output_dir)
+        job = {
+            "spec_path": input_spec,
+            "duration": duration,
+            "audio_path": "output/temp_processed_audio.wav",
+            "video_filename": "final_render.mp4",
+            "metadata_dir": "output/metadata"
+        }
+        for stage in (synthesis_stage, dsp_stage, video_stage):
+            stage(job, components)
         
-        # Stage 5: SEO Metadata Generation
-        logger.info("--- Stage 5: SEO Metadata Generation ---")
-        seo = SEOMetadataInjector()
-        metadata = seo.generate_all(tasks, duration)
-        
-        logger.info(f"✅ Pipeline Complete! Video: {video_path}")
-        return video_path, metadata
+        logger.info(f"✅ Pipeline Complete! Video: {job['video_path']}")
+        return job['video_path'], job['metadata']
 
     except Exception as e:
         logger.error(f"❌ Pipeline failed: {str(e)}", exc_info=True)
         raise
 
+def _stage_worker(
+    stage: Callable[[Dict[str, Any], Dict[str, Any]], None],
+    components: Dict[str, Any],
+    inbox: "queue.Queue[Optional[Dict[str, Any]]]",
+    outbox: "queue.Queue[Optional[Dict[str, Any]]]"
+):
+    """Runs one stage over every job from inbox, forwarding jobs (and the None sentinel) to outbox."""
+    while True:
+        job = inbox.get()
+        if job is None:
+            outbox.put(None)
+            return
+        # A failed job still flows downstream so later stages skip it and the run can report it
+        if 'error' not in job:
+            try:
+                stage(job, components)
+            except Exception as e:
+                logger.error(f"❌ {stage.__name__} failed for {job['spec_path']}: {str(e)}", exc_info=True)
+                job['error'] = e
+        outbox.put(job)
+
+def _job_names(input_specs: List[str]) -> List[str]:
+    """
+    Names each spec's outputs after its file stem. Stems shared by several specs get the
+    spec's batch index appended, since those specs run concurrently and would overwrite each other.
+    """
+    stems = [Path(spec_path).stem for spec_path in input_specs]
+    counts = Counter(stems)
+    names = [stem if counts[stem] == 1 else f"{stem}_{i}" for i, stem in enumerate(stems)]
+    if len(set(names)) < len(names):
+        # A suffixed name collided with another spec's stem; prefix every name with its index
+        names = [f"{i}_{stem}" for i, stem in enumerate(stems)]
+    return names
+
+def run_batch(input_specs: List[str], duration: int, output_dir: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Runs many specs through a three-stage pipeline (synthesis -> DSP -> video/SEO),
+    one thread per stage, so different specs occupy the network, CPU and encoder at once.
+    """
+    configure_logging()
+    logger.info(f"🚀 Starting Scripture Soaking Factory batch ({len(input_specs)} specs)")
+    os.makedirs(output_dir, exist_ok=True)
+    components = create_stage_components(output_dir)
+
+    stages = (synthesis_stage, dsp_stage, video_stage)
+    queues = [queue.Queue() for _ in range(len(stages) + 1)]
+
+    for name, spec_path in zip(_job_names(input_specs), input_specs):
+        queues[0].put({
+            "spec_path": spec_path,
+            "duration": duration,
+            "audio_path": os.path.join(output_dir, f"temp_{name}_audio.wav"),
+            "video_filename": f"{name}.mp4",
+            "metadata_dir": os.path.join(output_dir, "metadata", name)
+        })
+    queues[0].put(None)
+
+    with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="pipeline") as executor:
+        for i, stage in enumerate(stages):
+            executor.submit(_stage_worker, stage, components, queues[i], queues[i + 1])
+
+        finished = []
+        while (job := queues[-1].get()) is not None:
+            finished.append(job)
+
+    failed = [job['spec_path'] for job in finished if 'error' in job]
+    if failed:
+        raise RuntimeError(f"Pipeline failed for {len(failed)} spec(s): {', '.join(failed)}")
+    
+    logger.info(f"✅ Batch Complete! {len(finished)} videos rendered")
+    return [(job['video_path'], job['metadata']) for job in finished]
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Scripture Soaking Content Factory Pipeline")
-    parser.add_argument("--input", required=True, help="Path to spiritual spec JSON")
+    parser.add_argument("--input", required=True, nargs='+', help="Path(s) to spiritual spec JSON")
     parser.add_argument("--duration", type=int, default=8, help="Target video duration in hours")
     parser.add_argument("--output-dir", default="output/", help="Directory for output files")
     
     args = parser.parse_args()
     
-    run_pipeline(args.input, args.duration, args.output_dir)
+    if len(args.input) == 1:
+        run_pipeline(args.input[0], args.duration, args.output_dir)
+    else:
+        run_batch(args.input, args.duration, args.output_dir)
@@ -0,0 +1,30 @@
+"""
+Numba-compiled sample kernels used by the DSP engine.
+Each kernel makes a single pass over the buffer and writes into a caller-provided output.
+"""
+import numpy as np
+from numba import njit, prange
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def apply_deess_compress(data: np.ndarray, sibilants: np.ndarray, threshold: float, reduction: float, out: np.ndarray) -> np.ndarray:
+    """
+    Subtracts reduction * sibilants wherever the sibilant exceeds threshold.
+    Pass threshold/reduction as the buffer's dtype so the loop stays in single precision.
+    """
+    for i in prange(data.shape[0]):
+        s = sibilants[i]
+        if abs(s) > threshold:
+            out[i] = data[i] - s * reduction
+        else:
+            out[i] = data[i]
+    return out
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def mix_wet_dry(dry: np.ndarray, wet: np.ndarray, dry_gain: float, wet_gain: float, out: np.ndarray) -> np.ndarray:
+    """Blends the dry and wet signals as dry_gain * dry + wet_gain * wet."""
+    for i in prange(dry.shape[0]):
+        out[i] = dry_gain * dry[i] + wet_gain * wet[i]
+    return out
+
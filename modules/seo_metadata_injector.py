@@ -1,24 +1,39 @@
 import logging
 import yaml
-import json
+import orjson
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Dict, Any
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=None)
+def _load_config(config_path: str) -> Dict[str, Any]:
+    """Loads and caches the SEO template config; shared by every injector in the process."""
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
 class SEOMetadataInjector:
     """
     Generates YouTube-optimized metadata including titles, descriptions,
     tags, and chapter markers.
     """
     def __init__(self, config_path: str = "config/seo_templates.yaml"):
-        with open(config_path, 'r') as f:
-            self.config = yaml.safe_load(f)
+        self.config = _load_config(config_path)
         self.templates = self.config['templates']
 
+        # Bound format methods and the default-frequency tags, resolved once per injector
+        self._title_fmt = self.templates['title'].format
+        self._description_fmt = self.templates['description'].format
+        self._default_tags = self._format_tags(432)
+
+    def _format_tags(self, frequency: int) -> List[str]:
+        """Formats the tag templates for the given frequency."""
+        return [tag.format(frequency=frequency) for tag in self.templates['tags']]
+
     def generate_title(self, theme: str, duration: int, frequency: int = 432, audience: str = "Deep Sleep") -> str:
         """Generates a YouTube title based on the template."""
-        title = self.templates['title'].format(
+        title = self._title_fmt(
             duration=duration,
             theme=theme,
             frequency=frequency,
@@ -28,16 +43,16 @@ class SEOMetadataInjector:
 
     def generate_description(self, verses: List[Dict[str, Any]], duration: int, frequency: int = 432) -> str:
         """Generates a YouTube description with chapter markers."""
-        verse_list = ""
+        lines = []
         current_time = 0
         for verse in verses:
-            minutes, seconds = divmod(current_time, 60)
-            hours, minutes = divmod(minutes, 60)
-            timestamp = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            verse_list += f"{timestamp} - {verse['reference']} | {verse['text'][:30]}...\n"
+            hours, remainder = divmod(current_time, 3600)
+            minutes, seconds = divmod(remainder, 60)
+            lines.append(f"{hours:02d}:{minutes:02d}:{seconds:02d} - {verse['reference']} | {verse['text'][:30]}...")
             current_time += 30 # Estimated 30s per verse for the list
+        verse_list = "\n".join(lines)
             
-        description = self.templates['description'].format(
+        description = self._description_fmt(
             duration=duration,
             frequency=frequency,
             verse_list=verse_list
@@ -46,8 +61,9 @@ class SEOMetadataInjector:
 
     def generate_tags(self, frequency: int = 432) -> List[str]:
         """Generates a list of SEO tags."""
-        tags = [tag.format(frequency=frequency) for tag in self.templates['tags']]
-        return tags
+        if frequency == 432:
+            return list(self._default_tags)
+        return self._format_tags(frequency)
 
     def export_metadata(self, metadata: Dict[str, Any], output_dir: str = "output/metadata"):
         """Exports metadata to JSON and TXT files."""
@@ -57,8 +73,7 @@ class SEOMetadataInjector:
         base_name = "youtube_metadata"
         
         # JSON export
-        with open(out_path / f"{base_name}.json", 'w') as f:
-            json.dump(metadata, f, indent=4)
+        (out_path / f"{base_name}.json").write_bytes(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
             
         # TXT export for manual copy-paste
         with open(out_path / f"{base_name}.txt", 'w') as f:
@@ -68,7 +83,7 @@ class SEOMetadataInjector:
             
         logger.info(f"Metadata exported to {out_path}")
 
-    def generate_all(self, tasks: Dict[str, Any], duration_hours: int) -> Dict[str, Any]:
+    def generate_all(self, tasks: Dict[str, Any], duration_hours: int, output_dir: str = "output/metadata") -> Dict[str, Any]:
         """Orchestrates the generation of all metadata."""
         verses = tasks['vocal_tasks']
         theme = verses[0]['reference'].split(' ')[0] if verses else "Scripture"
@@ -79,5 +94,5 @@ class SEOMetadataInjector:
             "tags": self.generate_tags()
         }
         
-        self.export_metadata(metadata)
+        self.export_metadata(metadata, output_dir)
         return metadata
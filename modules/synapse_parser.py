@@ -1,5 +1,5 @@
-import json
 import logging
+import orjson
 import pickle
 from pathlib import Path
 from typing import List, Dict, Any, Optional
@@ -40,13 +40,12 @@ class SynapseParser:
         """Loads and validates the JSON spiritual spec."""
         logger.info(f"Loading spiritual spec from {self.file_path}")
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                raw_data = json.load(f)
+            raw_data = orjson.loads(self.file_path.read_bytes())
             
-            self.data = SpiritualSpec(**raw_data)
+            self.data = SpiritualSpec.model_validate(raw_data)
             logger.info("Spiritual spec validated successfully.")
             return self.data.model_dump()
-        except (json.JSONDecodeError, ValidationError) as e:
+        except (orjson.JSONDecodeError, ValidationError) as e:
             logger.error(f"Failed to load or validate spiritual spec: {e}")
             raise
 
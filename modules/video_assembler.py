@@ -1,7 +1,12 @@
+import os
 import logging
+import queue
+import shutil
+import subprocess
+import threading
 import ffmpeg
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
 logger = logging.getLogger(__name__)
 
@@ -10,9 +15,165 @@ class VideoAssembler:
     Assembles the final 4K video using FFmpeg, layering vocals, ambient drones,
     and looping background visuals.
     """
+    SOFTWARE_ENCODER = 'libvpx-vp9'  # Always-available fallback, last in ENCODER_PROFILES
+
+    # Video encoders in order of preference. 'hwaccel' is the decoder ffmpeg must list
+    # under -hwaccels; 'probe' is a one-frame test encode that proves the device exists;
+    # 'input'/'output' are the ffmpeg-python kwargs for each side.
+    ENCODER_PROFILES = {
+        'hevc_nvenc': {
+            'hwaccel': 'cuda',
+            'probe': ['-f', 'lavfi', '-i', 'nullsrc=s=256x256', '-frames:v', '1', '-c:v', 'hevc_nvenc'],
+            'input': {'hwaccel': 'cuda', 'hwaccel_output_format': 'cuda'},
+            'output': {
+                'vcodec': 'hevc_nvenc',
+                'vf': 'scale_cuda=3840:2160',
+                'preset': 'p4',
+                'tune': 'hq',
+                'rc': 'vbr',
+                'cq': 28,
+                'tag:v': 'hvc1',
+                **{'b:v': '20M', 'maxrate': '25M', 'bufsize': '50M'}
+            }
+        },
+        'h264_vaapi': {
+            'hwaccel': 'vaapi',
+            'probe': [
+                '-vaapi_device', '/dev/dri/renderD128',
+                '-f', 'lavfi', '-i', 'nullsrc=s=256x256',
+                '-vf', 'format=nv12,hwupload', '-frames:v', '1', '-c:v', 'h264_vaapi'
+            ],
+            'input': {
+                'hwaccel': 'vaapi',
+                'hwaccel_output_format': 'vaapi',
+                'vaapi_device': '/dev/dri/renderD128'
+            },
+            'output': {
+                'vcodec': 'h264_vaapi',
+                'vf': 'scale_vaapi=w=3840:h=2160:format=nv12',
+                **{'b:v': '20M', 'maxrate': '25M', 'bufsize': '50M'}
+            }
+        },
+        SOFTWARE_ENCODER: {
+            'hwaccel': None,
+            'probe': None,
+            'input': {},
+            'output': {
+                'vcodec': 'libvpx-vp9',
+                'crf': 30,
+                's': '3840x2160',
+                'pix_fmt': 'yuv420p',
+                **{'b:v': '20M', 'maxrate': '25M', 'bufsize': '50M'}
+            }
+        }
+    }
+
+    WRITE_CHUNK_SIZE = 1 << 20  # Bytes per pipe read / file write
+    RING_BUFFER_CHUNKS = 256    # Chunks buffered between ffmpeg and disk (256 MiB)
+
     def __init__(self, output_dir: str = "output/rendered_videos"):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.loop_cache_dir = self.output_dir / "loop_cache"
+        self._available_encoders: Optional[List[str]] = None
+
+    def _ffmpeg_capabilities(self, flag: str) -> str:
+        """Returns the output of `ffmpeg -hide_banner <flag>`, or '' if ffmpeg can't be run."""
+        if not shutil.which("ffmpeg"):
+            return ""
+        try:
+            result = subprocess.run(
+                ["ffmpeg", "-hide_banner", flag],
+                capture_output=True, text=True, timeout=10
+            )
+        except (OSError, subprocess.SubprocessError):
+            return ""
+        return result.stdout
+
+    def _probe_encoder(self, encoder: str) -> bool:
+        """Runs the profile's one-frame test encode to null and reports whether it succeeded."""
+        probe = self.ENCODER_PROFILES[encoder]['probe']
+        if probe is None:
+            return True
+        try:
+            result = subprocess.run(
+                ["ffmpeg", "-hide_banner", "-loglevel", "error", *probe, "-f", "null", "-"],
+                capture_output=True, timeout=30
+            )
+        except (OSError, subprocess.SubprocessError):
+            return False
+        if result.returncode != 0:
+            logger.info(f"Encoder {encoder} is built in but unusable on this host")
+        return result.returncode == 0
+
+    def select_encoder(self, exclude: Optional[List[str]] = None) -> str:
+        """
+        Picks the first encoder from ENCODER_PROFILES that ffmpeg was built with and whose
+        device passes a test encode (ffmpeg lists compiled-in encoders, not devices present).
+        Capabilities are probed once; exclude skips encoders already tried by the caller.
+        """
+        if self._available_encoders is None:
+            hwaccels = self._ffmpeg_capabilities("-hwaccels").split()
+            encoders = self._ffmpeg_capabilities("-encoders")
+            self._available_encoders = [
+                name for name, profile in self.ENCODER_PROFILES.items()
+                if profile['hwaccel'] in hwaccels and name in encoders and self._probe_encoder(name)
+            ]
+        for name in self._available_encoders:
+            if name not in (exclude or []):
+                return name
+        return self.SOFTWARE_ENCODER
+
+    def _prepare_loop_with_fallback(self, background_path: str) -> Path:
+        """
+        Prepares the background loop with the preferred encoder. If a hardware transcode
+        still fails (e.g. NVENC out of sessions), the next encoder is tried for this clip only;
+        device availability is decided by the one-time test encode, never by a real transcode.
+        """
+        if not Path(background_path).exists():
+            raise FileNotFoundError(f"Background video not found: {background_path}")
+
+        tried: List[str] = []
+        while True:
+            encoder = self.select_encoder(exclude=tried)
+            logger.info(f"Using video encoder: {encoder}")
+            try:
+                return self.prepare_background_loop(background_path, encoder)
+            except ffmpeg.Error:
+                if encoder == self.SOFTWARE_ENCODER:
+                    raise
+                logger.warning(f"Transcode with {encoder} failed; retrying with the next encoder")
+                tried.append(encoder)
+
+    def prepare_background_loop(self, background_path: str, encoder: str) -> Path:
+        """
+        Transcodes the background clip once to 4K/30fps in the target codec so the
+        final render can loop it with stream copy. Reuses the cached clip if it is newer.
+        """
+        source = Path(background_path)
+        self.loop_cache_dir.mkdir(parents=True, exist_ok=True)
+        loop_path = self.loop_cache_dir / f"{source.stem}_{encoder}.mp4"
+
+        if loop_path.exists() and loop_path.stat().st_mtime >= source.stat().st_mtime:
+            logger.info(f"Using cached background loop: {loop_path}")
+            return loop_path
+
+        logger.info(f"Transcoding background loop with {encoder}: {loop_path}")
+        profile = self.ENCODER_PROFILES[encoder]
+        # Encode to a temp name and only publish on success, so a failed or interrupted
+        # transcode never leaves a truncated clip that the freshness check would reuse
+        partial_path = loop_path.with_name(f"{loop_path.stem}.partial{loop_path.suffix}")
+        try:
+            (
+                ffmpeg.input(str(source), **profile['input'])
+                .output(str(partial_path), r=30, an=None, **profile['output'])
+                .run(overwrite_output=True)
+            )
+        except BaseException:
+            partial_path.unlink(missing_ok=True)
+            raise
+        os.replace(partial_path, loop_path)
+        return loop_path
 
     def render_final_video(
         self, 
@@ -30,40 +191,106 @@ class VideoAssembler:
         logger.info(f"Starting final render: {output_path} ({duration_hours} hours)")
         
         try:
-            # Input background loop
-            video_input = ffmpeg.input(background_path, stream_loop=-1, t=duration_seconds)
+            # Encode the short background once; the long render only muxes it
+            loop_path = self._prepare_loop_with_fallback(background_path)
+            
+            # Input background loop. The clip is our own pre-transcoded file, so skip
+            # stream probing/analysis instead of spending seconds on it before muxing starts
+            video_input = ffmpeg.input(
+                str(loop_path),
+                stream_loop=-1,
+                t=duration_seconds,
+                probesize='32',
+                analyzeduration='0',
+                fpsprobesize=0,
+                fflags='+discardcorrupt'
+            )
             
             # Input processed audio
             audio_input = ffmpeg.input(audio_path)
             
-            # Assembly
+            # Assembly. Output goes to stdout as fragmented MP4 (plain MP4 needs a seekable
+            # file) and is written to disk by a separate thread, so slow disks don't stall ffmpeg
             stream = ffmpeg.output(
                 video_input,
                 audio_input,
-                str(output_path),
-                vcodec='libvpx-vp9',
-                video_bitrate='20M',
+                'pipe:1',
+                format='mp4',
+                movflags='frag_keyframe+empty_moov',
+                vcodec='copy',
                 acodec='libopus',
                 audio_bitrate='128k',
-                crf=30,
-                s='3840x2160',
-                r=30,
-                pix_fmt='yuv420p',
-                **{'b:v': '20M', 'maxrate': '25M', 'bufsize': '50M'}
+                max_muxing_queue_size=1024  # Don't stall on audio while video packets queue up
             ).global_args('-threads', '8')
             
-            # In a real scenario, we would use .run_async() to track progress
-            # For this implementation, we'll use .run()
             logger.info("Executing FFmpeg command...")
-            stream.run(overwrite_output=True)
+            process = stream.run_async(pipe_stdout=True)
+            self._pipe_to_file(process, output_path)
+            
+            if process.wait() != 0:
+                raise ffmpeg.Error('ffmpeg', None, None)
             
             logger.info(f"Render complete: {output_path}")
             return str(output_path)
             
         except ffmpeg.Error as e:
-            logger.error(f"FFmpeg error: {e.stderr.decode()}")
+            logger.error(f"FFmpeg error: {e.stderr.decode() if e.stderr else e}")
             raise
 
+    def _pipe_to_file(self, process: subprocess.Popen, output_path: Path) -> None:
+        """
+        Drains ffmpeg's stdout into a bounded chunk queue while a writer thread
+        appends the chunks to output_path in WRITE_CHUNK_SIZE writes.
+        A failed open or write kills ffmpeg immediately and re-raises the error.
+        """
+        # Open on the calling thread so an unwritable destination fails before any thread starts
+        try:
+            f = open(output_path, 'wb', buffering=self.WRITE_CHUNK_SIZE)
+        except OSError:
+            process.kill()
+            process.wait()
+            raise
+
+        chunks: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=self.RING_BUFFER_CHUNKS)
+        failed = threading.Event()
+        errors = []
+
+        def _writer() -> None:
+            try:
+                with f:
+                    while (chunk := chunks.get()) is not None:
+                        f.write(chunk)
+            except OSError as e:
+                errors.append(e)
+                failed.set()
+
+        def _put(item: Optional[bytes]) -> bool:
+            # Never block on a full queue once the writer is gone
+            while not failed.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        writer = threading.Thread(target=_writer, name="render-writer", daemon=True)
+        writer.start()
+        try:
+            while not failed.is_set():
+                chunk = process.stdout.read(self.WRITE_CHUNK_SIZE)
+                if not chunk or not _put(chunk):
+                    break
+        finally:
+            _put(None)
+            writer.join()
+
+        if errors:
+            # Stop the render now rather than letting ffmpeg encode the rest of 8 hours
+            process.kill()
+            process.wait()
+            raise errors[0]
+
     def add_text_overlay(self, video_path: str, text: str, start_time: float, duration: float) -> str:
         """
         Adds a text overlay to a video segment.
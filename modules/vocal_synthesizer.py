@@ -1,11 +1,12 @@
 import os
+import asyncio
 import logging
-import hashlib
-import requests
+import httpx
+import xxhash
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 from pydub import AudioSegment
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import AsyncRetrying, retry, stop_after_attempt, wait_exponential
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,7 @@ class VocalSynthesizer:
         "declaração_de_shalom": "AZnzlk1XhkDPsW8n3W8X",   # Domi (peaceful, steady)
         "passividade_sagrada": "EXAVITQu4vr4xnNLMQbo",    # Bella (gentle, whispered)
     }
+    MAX_CONCURRENT_REQUESTS = 8  # In-flight ElevenLabs calls during batch synthesis
 
     def __init__(self, api_key: Optional[str] = None, cache_dir: str = "assets/cache/vocals"):
         self.api_key = api_key or os.getenv("ELEVENLABS_API_KEY")
@@ -27,6 +29,13 @@ class VocalSynthesizer:
         if not self.api_key:
             logger.warning("ELEVENLABS_API_KEY not found. Synthesis will fail unless using cache.")
 
+        # Persistent HTTP/2 connection, reused across verses instead of a TLS handshake per call
+        self._headers = {
+            "xi-api-key": self.api_key or "",
+            "Content-Type": "application/json"
+        }
+        self._client = httpx.Client(http2=True, timeout=30.0, headers=self._headers)
+
     def select_voice_profile(self, emotion: str) -> str:
         """Maps emotional intention to ElevenLabs voice ID."""
         return self.VOICE_MAPPING.get(emotion, "21m00Tcm4TlvDq8ikWAM") # Default to Rachel
@@ -40,17 +49,16 @@ class VocalSynthesizer:
 
     def get_cache_path(self, text: str, voice_id: str) -> Path:
         """Generates a unique cache path based on text and voice."""
-        hash_key = hashlib.md5(f"{text}{voice_id}".encode()).hexdigest()
-        return self.cache_dir / f"{hash_key}.wav"
+        # Non-cryptographic 128-bit key; the separator keeps voice/text boundaries unambiguous
+        h = xxhash.xxh3_128()
+        h.update(voice_id.encode())
+        h.update(b'\0')
+        h.update(text.encode('utf-8'))
+        return self.cache_dir / f"{h.hexdigest()}.wav"
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-    def _call_elevenlabs(self, text: str, voice_id: str) -> bytes:
-        """Internal method to call ElevenLabs API with retry logic."""
+    def _build_request(self, text: str, voice_id: str) -> Tuple[str, Dict[str, Any]]:
+        """Builds the ElevenLabs text-to-speech URL and payload."""
         url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-        headers = {
-            "xi-api-key": self.api_key,
-            "Content-Type": "application/json"
-        }
         payload = {
             "text": text,
             "model_id": "eleven_monolingual_v1",
@@ -59,11 +67,44 @@ class VocalSynthesizer:
                 "similarity_boost": 0.85
             }
         }
+        return url, payload
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    def _call_elevenlabs(self, text: str, voice_id: str) -> bytes:
+        """Internal method to call ElevenLabs API with retry logic."""
+        url, payload = self._build_request(text, voice_id)
         
-        response = requests.post(url, json=payload, headers=headers)
+        response = self._client.post(url, json=payload)
         response.raise_for_status()
         return response.content
 
+    async def _call_elevenlabs_async(self, client: httpx.AsyncClient, text: str, voice_id: str) -> bytes:
+        """Async variant of _call_elevenlabs with the same retry policy."""
+        url, payload = self._build_request(text, voice_id)
+        
+        async for attempt in AsyncRetrying(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10)):
+            with attempt:
+                response = await client.post(url, json=payload)
+                response.raise_for_status()
+        return response.content
+
+    def _save_vocal(self, audio_data: bytes, cache_path: Path) -> None:
+        """Converts the returned MP3 to a normalized 48kHz, 24-bit mono WAV at cache_path."""
+        # Save as WAV 48kHz, 24-bit (via pydub)
+        temp_mp3 = cache_path.with_suffix('.mp3')
+        with open(temp_mp3, 'wb') as f:
+            f.write(audio_data)
+            
+        audio = AudioSegment.from_mp3(temp_mp3)
+        audio = audio.set_frame_rate(48000).set_sample_width(3).set_channels(1)
+        
+        # Normalize to -18 LUFS (approximate with dBFS)
+        change_in_dbfs = -18.0 - audio.dBFS
+        audio = audio.apply_gain(change_in_dbfs)
+        
+        audio.export(cache_path, format="wav")
+        temp_mp3.unlink() # Remove temp file
+
     def synthesize_verse(self, text: str, emotion: str) -> str:
         """
         Synthesizes a single verse. Returns path to the WAV file.
@@ -80,20 +121,54 @@ class VocalSynthesizer:
             raise ValueError("API Key required for synthesis.")
 
         audio_data = self._call_elevenlabs(text, voice_id)
+        self._save_vocal(audio_data, cache_path)
         
-        # Save as WAV 48kHz, 24-bit (via pydub)
-        temp_mp3 = cache_path.with_suffix('.mp3')
-        with open(temp_mp3, 'wb') as f:
-            f.write(audio_data)
-            
-        audio = AudioSegment.from_mp3(temp_mp3)
-        audio = audio.set_frame_rate(48000).set_sample_width(3).set_channels(1)
+        return str(cache_path)
+
+    async def _synthesize_verse_async(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        text: str,
+        voice_id: str
+    ) -> str:
+        """Async counterpart of synthesize_verse for a resolved voice ID."""
+        cache_path = self.get_cache_path(text, voice_id)
         
-        # Normalize to -18 LUFS (approximate with dBFS)
-        change_in_dbfs = -18.0 - audio.dBFS
-        audio = audio.apply_gain(change_in_dbfs)
+        if cache_path.exists():
+            logger.info(f"Using cached vocal for: {text[:30]}...")
+            return str(cache_path)
+
+        logger.info(f"Synthesizing vocal for: {text[:30]}...")
+        if not self.api_key:
+            raise ValueError("API Key required for synthesis.")
+
+        async with semaphore:
+            audio_data = await self._call_elevenlabs_async(client, text, voice_id)
         
-        audio.export(cache_path, format="wav")
-        temp_mp3.unlink() # Remove temp file
+        # Disk write and MP3 decoding are blocking; keep them off the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._save_vocal, audio_data, cache_path)
         
         return str(cache_path)
+
+    async def _synthesize_batch_async(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        """Synthesizes (text, voice_id) pairs concurrently, bounded by MAX_CONCURRENT_REQUESTS."""
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_REQUESTS)
+        async with httpx.AsyncClient(http2=True, timeout=30.0, headers=self._headers) as client:
+            return await asyncio.gather(*(
+                self._synthesize_verse_async(client, semaphore, text, voice_id)
+                for text, voice_id in pairs
+            ))
+
+    def synthesize_batch(self, tasks: List[Dict[str, Any]]) -> List[str]:
+        """
+        Synthesizes a list of vocal tasks concurrently. Returns WAV paths in task order.
+        """
+        pairs = [(task['text'], self.select_voice_profile(task['emotion'])) for task in tasks]
+        # Repeated verses share a cache file, so only synthesize each one once
+        unique_pairs = list(dict.fromkeys(pairs))
+        paths = asyncio.run(self._synthesize_batch_async(unique_pairs))
+        
+        path_by_pair = dict(zip(unique_pairs, paths))
+        return [path_by_pair[pair] for pair in pairs]